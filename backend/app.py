@@ -1,12 +1,9 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Blueprint, Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-import pandas as pd
 import os
 import re
-from playwright.sync_api import sync_playwright
-import time
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+import json
+import importlib
 from dotenv import load_dotenv
 from auth import (
     token_required, generate_token, hash_password, 
@@ -14,70 +11,94 @@ from auth import (
     get_user_by_google_id, update_last_login
 )
 
-load_dotenv()
+# Heavy modules (pandas, the spreadsheet engines, google-auth, reportlab, PIL)
+# are imported inside the routes that need them so workers boot quickly.
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'your-secret-key')
-CORS(app, supports_credentials=True)
+load_dotenv()
 
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 
 UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
 
-# Global variable to track the current active file
-current_file_path = None
+# Modules imported by preload() before gunicorn forks its workers
+PRELOAD_MODULES = [
+    'pandas',
+    'numpy',
+    'openpyxl',
+    'pyarrow',
+    'google_tokens',
+    'reportlab.pdfgen.canvas',
+    'PIL.Image',
+    'query_engine',
+    'column_index',
+    'sampling',
+    'residency',
+    'charts',
+]
+
+api = Blueprint('api', __name__)
+
+def current_file_path():
+    """Path of the active uploaded file, shared by all workers."""
+    from residency import get_active_dataset
+    return get_active_dataset()
+
 
 def load_current_file():
-    """Load the currently active uploaded file."""
-    global current_file_path
-    if not current_file_path or not os.path.exists(current_file_path):
+    """Load the currently active uploaded file from the shared dataset cache."""
+    path = current_file_path()
+    if not path:
         return None, None
     
-    if current_file_path.endswith('.csv'):
-        df = pd.read_csv(current_file_path)
-    else:
-        df = pd.read_excel(current_file_path)
-    return df, current_file_path
+    from residency import get_dataset
+    return get_dataset(path), path
+
 
+def dataset_key(path):
+    """
+    Version id of a dataset, the one the shared cache and samples use, so
+    indexes and dashboards are invalidated the same way.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    from residency import dataset_id
+    return dataset_id(path)
 
-@app.route('/')
+
+@api.route('/')
 def home():
     return jsonify({"message": "Backend is running!"})
 
 
 # ==================== AUTH ROUTES ====================
 
-@app.route('/auth/register', methods=['POST'])
-def register():
-    """Register a new user with email and password"""
+def register_user(data):
+    """Register a new user with email and password. Returns (body, status)."""
     try:
-        data = request.json
         email = data.get('email', '').strip().lower()
         password = data.get('password', '')
         name = data.get('name', '')
         
         if not email or not password:
-            return jsonify({"error": "Email and password are required"}), 400
+            return {"error": "Email and password are required"}, 400
         
         if len(password) < 6:
-            return jsonify({"error": "Password must be at least 6 characters"}), 400
+            return {"error": "Password must be at least 6 characters"}, 400
         
         # Check if user already exists
         existing_user = get_user_by_email(email)
         if existing_user:
-            return jsonify({"error": "User already exists"}), 400
+            return {"error": "User already exists"}, 400
         
         # Create user
         user = create_user(email=email, password=password, name=name)
         if not user:
-            return jsonify({"error": "Failed to create user"}), 500
+            return {"error": "Failed to create user"}, 500
         
         # Generate token
         token = generate_token(user['_id'], user['email'])
         
-        return jsonify({
+        return {
             "message": "User registered successfully",
             "token": token,
             "user": {
@@ -85,35 +106,33 @@ def register():
                 "name": user['name'],
                 "picture": user.get('picture')
             }
-        }), 201
+        }, 201
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 
-@app.route('/auth/login', methods=['POST'])
-def login():
-    """Login with email and password"""
+def login_user(data):
+    """Login with email and password. Returns (body, status)."""
     try:
-        data = request.json
         email = data.get('email', '').strip().lower()
         password = data.get('password', '')
         
         if not email or not password:
-            return jsonify({"error": "Email and password are required"}), 400
+            return {"error": "Email and password are required"}, 400
         
         # Get user
         user = get_user_by_email(email)
         if not user:
-            return jsonify({"error": "Invalid email or password"}), 401
+            return {"error": "Invalid email or password"}, 401
         
         # Check if user registered with Google
         if user.get('auth_provider') == 'google':
-            return jsonify({"error": "Please sign in with Google"}), 401
+            return {"error": "Please sign in with Google"}, 401
         
         # Verify password
         if not verify_password(password, user.get('password', '')):
-            return jsonify({"error": "Invalid email or password"}), 401
+            return {"error": "Invalid email or password"}, 401
         
         # Update last login
         update_last_login(email)
@@ -121,7 +140,7 @@ def login():
         # Generate token
         token = generate_token(user['_id'], user['email'])
         
-        return jsonify({
+        return {
             "message": "Login successful",
             "token": token,
             "user": {
@@ -129,29 +148,24 @@ def login():
                 "name": user['name'],
                 "picture": user.get('picture')
             }
-        }), 200
+        }, 200
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 
-@app.route('/auth/google', methods=['POST'])
-def google_auth():
-    """Authenticate with Google OAuth"""
+def google_login(data):
+    """Authenticate with Google OAuth. Returns (body, status)."""
     try:
-        data = request.json
         token = data.get('credential') or data.get('token')
         
         if not token:
-            return jsonify({"error": "Google token is required"}), 400
+            return {"error": "Google token is required"}, 400
         
-        # Verify Google token
+        # Verify Google token against the cached signing keys
+        from google_tokens import verify_google_id_token
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                google_requests.Request(), 
-                GOOGLE_CLIENT_ID
-            )
+            idinfo = verify_google_id_token(token, GOOGLE_CLIENT_ID)
             
             google_id = idinfo['sub']
             email = idinfo['email']
@@ -159,7 +173,7 @@ def google_auth():
             picture = idinfo.get('picture')
             
         except ValueError as e:
-            return jsonify({"error": "Invalid Google token"}), 401
+            return {"error": "Invalid Google token"}, 401
         
         # Check if user exists by Google ID
         user = get_user_by_google_id(google_id)
@@ -177,7 +191,7 @@ def google_auth():
                     picture=picture
                 )
                 if not user:
-                    return jsonify({"error": "Failed to create user"}), 500
+                    return {"error": "Failed to create user"}, 500
         
         # Update last login
         update_last_login(email)
@@ -185,7 +199,7 @@ def google_auth():
         # Generate JWT token
         jwt_token = generate_token(user['_id'], user['email'])
         
-        return jsonify({
+        return {
             "message": "Google authentication successful",
             "token": jwt_token,
             "user": {
@@ -193,28 +207,56 @@ def google_auth():
                 "name": user['name'],
                 "picture": user.get('picture')
             }
-        }), 200
+        }, 200
         
     except Exception as e:
         print(f"Google auth error: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
 
+# The auth logic above is shared with the ASGI handlers in asgi.py
+
+@api.route('/auth/register', methods=['POST'])
+def register():
+    """Register a new user with email and password"""
+    body, status = register_user(request.json)
+    return jsonify(body), status
 
-@app.route('/auth/me', methods=['GET'])
+
+@api.route('/auth/login', methods=['POST'])
+def login():
+    """Login with email and password"""
+    body, status = login_user(request.json)
+    return jsonify(body), status
+
+
+@api.route('/auth/google', methods=['POST'])
+def google_auth():
+    """Authenticate with Google OAuth"""
+    body, status = google_login(request.json)
+    return jsonify(body), status
+
+
+@api.route('/auth/me', methods=['GET'])
 @token_required
 def get_current_user(current_user):
     """Get current authenticated user"""
-    return jsonify({
+    return jsonify(user_profile(current_user)), 200
+
+
+def user_profile(user):
+    """Public fields of a user document."""
+    return {
         "user": {
-            "email": current_user['email'],
-            "name": current_user['name'],
-            "picture": current_user.get('picture'),
-            "auth_provider": current_user.get('auth_provider')
+            "email": user['email'],
+            "name": user['name'],
+            "picture": user.get('picture'),
+            "auth_provider": user.get('auth_provider')
         }
-    }), 200
+    }
 
 
-@app.route('/auth/logout', methods=['POST'])
+@api.route('/auth/logout', methods=['POST'])
 @token_required
 def logout(current_user):
     """Logout user (client should delete token)"""
@@ -223,11 +265,40 @@ def logout(current_user):
 
 # ==================== SPREADSHEET ROUTES ====================
 
-@app.route('/upload', methods=['POST'])
+def set_current_file(path):
+    """Make an uploaded file the active dataset for every worker."""
+    from residency import set_active_dataset
+    set_active_dataset(path)
+
+
+def summarize_upload(filepath):
+    """Parse an uploaded spreadsheet, sample it and summarize it."""
+    from residency import get_dataset
+    from sampling import build_sample
+    df = get_dataset(filepath)
+
+    columns = df.columns.tolist()
+    rows = len(df)
+
+    # Keep a stratified sample for approximate queries
+    build_sample(filepath, df)
+
+    # Basic summary instead of using heavy model
+    summary = f"Uploaded spreadsheet with {rows} rows and {len(columns)} columns: {', '.join(columns[:5])}"
+    if len(columns) > 5:
+        summary += f" and {len(columns)-5} more"
+
+    return {
+        "columns": columns,
+        "rows": rows,
+        "summary": summary
+    }
+
+
+@api.route('/upload', methods=['POST'])
 @token_required
 def upload_file(current_user):
     """Upload and summarize spreadsheet."""
-    global current_file_path
     if 'file' not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
@@ -236,37 +307,32 @@ def upload_file(current_user):
     file.save(filepath)
     
     # Set this as the current active file
-    current_file_path = filepath
+    set_current_file(filepath)
 
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(filepath)
-        else:
-            df = pd.read_excel(filepath)
-
-        columns = df.columns.tolist()
-        rows = len(df)
-
-        # Basic summary instead of using heavy model
-        summary = f"Uploaded spreadsheet with {rows} rows and {len(columns)} columns: {', '.join(columns[:5])}"
-        if len(columns) > 5:
-            summary += f" and {len(columns)-5} more"
-
-        return jsonify({
-            "columns": columns,
-            "rows": rows,
-            "summary": summary
-        })
-
+        return jsonify(summarize_upload(filepath))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/dashboard', methods=['POST'])
+@api.route('/dashboard', methods=['POST'])
 @token_required
 def generate_dashboard(current_user):
-    """Generate dashboard analytics for the uploaded file."""
+    """Generate dashboard analytics for the uploaded file.
+
+    Optional body: {"points": 500, "downsample": "lttb" | "minmax"} sets the
+    point budget for the trend chart.
+    """
     try:
+        from charts import build_dashboard_data, cache_dashboard, chart_options, get_cached_dashboard
+        point_budget, method = chart_options(request.get_json(silent=True))
+        
+        key = dataset_key(current_file_path())
+        cache_key = (key, point_budget, method) if key else None
+        dashboard = get_cached_dashboard(cache_key)
+        if dashboard is not None:
+            return jsonify(dashboard)
+        
         df, path = load_current_file()
         if df is None:
             return jsonify({"error": "No uploaded file found"}), 400
@@ -280,6 +346,8 @@ def generate_dashboard(current_user):
         print(f"Numeric columns: {numeric_cols}")
         print(f"Categorical columns: {categorical_cols}")
         
+        numeric_stats, charts = build_dashboard_data(df, point_budget, method)
+        
         # Basic summary
         dashboard = {
             "summary": {
@@ -289,65 +357,10 @@ def generate_dashboard(current_user):
                 "categorical_columns": len(categorical_cols),
                 "file_name": os.path.basename(path) if path else "Unknown"
             },
-            "numeric_stats": {},
-            "charts": []
+            "numeric_stats": numeric_stats,
+            "charts": charts
         }
         
-        # Generate statistics for numeric columns (max 5)
-        for col in numeric_cols[:5]:
-            col_data = df[col].dropna()
-            if len(col_data) > 0:
-                dashboard["numeric_stats"][col] = {
-                    "min": float(col_data.min()),
-                    "max": float(col_data.max()),
-                    "mean": float(col_data.mean()),
-                    "median": float(col_data.median()),
-                    "sum": float(col_data.sum()),
-                    "std": float(col_data.std()) if len(col_data) > 1 else 0
-                }
-        
-        # Generate chart data for categorical columns (max 3)
-        for col in categorical_cols[:3]:
-            # Convert to string to handle datetime and other special types
-            col_data = df[col].astype(str)
-            value_counts = col_data.value_counts().head(10)
-            if len(value_counts) > 0:
-                dashboard["charts"].append({
-                    "type": "bar",
-                    "title": f"Distribution of {col}",
-                    "column": col,
-                    "labels": [str(x) for x in value_counts.index.tolist()],
-                    "data": value_counts.values.tolist()
-                })
-        
-        # Generate trend chart for first numeric column if exists
-        if len(numeric_cols) > 0:
-            first_num_col = numeric_cols[0]
-            # Take first 50 rows for trend
-            trend_data = df[first_num_col].head(50).tolist()
-            dashboard["charts"].append({
-                "type": "line",
-                "title": f"Trend of {first_num_col}",
-                "column": first_num_col,
-                "labels": list(range(1, len(trend_data) + 1)),
-                "data": trend_data
-            })
-        
-        # Add pie chart for first categorical column
-        if len(categorical_cols) > 0:
-            first_cat_col = categorical_cols[0]
-            # Convert to string to handle datetime and other special types
-            col_data = df[first_cat_col].astype(str)
-            value_counts = col_data.value_counts().head(5)
-            if len(value_counts) > 0:
-                dashboard["charts"].append({
-                    "type": "pie",
-                    "title": f"Composition of {first_cat_col}",
-                    "column": first_cat_col,
-                    "labels": [str(x) for x in value_counts.index.tolist()],
-                    "data": value_counts.values.tolist()
-                })
-        
         # Add data preview - convert to string to handle NaT and other types
         preview_df = df.head(10).copy()
         # Convert all columns to string to avoid serialization issues
@@ -355,6 +368,7 @@ def generate_dashboard(current_user):
             preview_df[col] = preview_df[col].astype(str)
         dashboard["preview"] = preview_df.to_dict(orient='records')
         
+        cache_dashboard(cache_key, dashboard)
         print("Dashboard generated successfully")
         return jsonify(dashboard)
     
@@ -365,25 +379,86 @@ def generate_dashboard(current_user):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/query', methods=['POST'])
+@api.route('/query', methods=['POST'])
 @token_required
 def query_data(current_user):
-    """Smart query handling with enhanced rule-based system."""
+    """Smart query handling with enhanced rule-based system.
+
+    Pass "approximate": true to answer count/sum/average queries from the
+    sample kept at upload, with a 95% confidence interval. Adding
+    "refine": true streams the approximate answer followed by the exact one
+    as newline-delimited JSON.
+    """
     data = request.json
     query = data.get("query", "").lower().strip()
 
-    df, path = load_current_file()
-    if df is None:
-        return jsonify({"error": "No uploaded file found"}), 400
+    from sampling import approximate_answer, build_sample, get_sample
+
+    if data.get("approximate"):
+        sample = get_sample(current_file_path())
+        try:
+            approx = approximate_answer(sample, query) if sample else None
+        except Exception as e:
+            print(f"Approximate query failed, using exact mode: {e}")
+            approx = None
+        
+        if approx and data.get("refine") and approx["mode"] == "approximate":
+            return Response(stream_with_context(refine_query(query, approx)), mimetype='application/x-ndjson')
+        if approx:
+            return jsonify(approx)
 
     try:
-        return handle_query_with_rules(df, query)
+        df, path = load_current_file()
+        if df is None:
+            return jsonify({"error": "No uploaded file found"}), 400
+
+        response = handle_query_with_rules(df, query, dataset_key(path))
+        if data.get("approximate"):
+            # Sample may have been evicted from the shared cache; rebuild it for next time
+            if get_sample(path) is None:
+                build_sample(path, df)
+            result = response.get_json()
+            result["mode"] = "exact"
+            return jsonify(result)
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-def handle_query_with_rules(df, query):
+def refine_query(query, approx):
+    """Yield the approximate answer first, then the exact one."""
+    yield json.dumps(approx) + "\n"
+    try:
+        df, path = load_current_file()
+        if df is None:
+            yield json.dumps({"error": "No uploaded file found"}) + "\n"
+            return
+        exact = handle_query_with_rules(df, query, dataset_key(path)).get_json()
+        exact["mode"] = "exact"
+        yield json.dumps(exact) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
+def extreme_rows(df, column, indexes, largest=True):
+    """Max (or min) of a numeric column and every row tied with it."""
+    index = indexes(column) if indexes else None
+    if index is None:
+        value = df[column].max() if largest else df[column].min()
+        return value, df[df[column] == value]
+    
+    _, positions = index.extreme(largest)
+    rows = df.iloc[positions]
+    value = rows[column].iloc[0] if len(rows) > 0 else float('nan')
+    return value, rows
+
+
+def handle_query_with_rules(df, query, dataset_key=None):
     """Enhanced rule-based query handler with SQL-like filtering."""
+    import pandas as pd
+    from query_engine import compile_query, execute_query, resolve_column
+    from column_index import index_lookup
+    
     clean_query = re.sub(r'[^a-z0-9\s]', '', query)
     
     numeric_cols = df.select_dtypes(include='number').columns.tolist()
@@ -394,62 +469,21 @@ def handle_query_with_rules(df, query):
     for col in numeric_cols:
         df[col] = pd.to_numeric(df[col], errors='coerce')
     
+    # Sorted/zone-map indexes, cached per dataset version
+    indexes = index_lookup(dataset_key, df)
+    
+    # === COMPILED QUERIES (WHERE / GROUP BY) ===
+    # Examples: "give me fullName where codolio > 800",
+    # "average salary by department where age > 30 and city = pune"
+    spec = compile_query(query, all_cols)
+    if spec:
+        result = execute_query(df, spec, indexes)
+        return jsonify({"query": query, **result})
+    
     # === ROW COUNT ===
     if any(k in clean_query for k in ["how many rows", "number of rows", "row count", "count rows"]):
         return jsonify({"query": query, "answer": f"{len(df)} rows", "type": "count"})
     
-    # === CONDITIONAL FILTERING (WHERE clause) ===
-    # Examples: "give me fullName where codolio > 800", "show names where score greater than 50"
-    where_patterns = [
-        (r'(give|show|get|find)\s+(?:me\s+)?(\w+)\s+where\s+(\w+)\s+(?:score\s+)?(?:is\s+)?(?:greater|more|higher)\s+than\s+(\d+)', 'greater'),
-        (r'(give|show|get|find)\s+(?:me\s+)?(\w+)\s+where\s+(\w+)\s+(?:score\s+)?(?:is\s+)?(?:less|lower|smaller)\s+than\s+(\d+)', 'less'),
-        (r'(give|show|get|find)\s+(?:me\s+)?(\w+)\s+where\s+(\w+)\s+(?:score\s+)?(?:is\s+)?equals?\s+(\d+)', 'equal'),
-        (r'(give|show|get|find)\s+(?:me\s+)?(\w+)\s+where\s+(\w+)\s*[>]\s*(\d+)', 'greater'),
-        (r'(give|show|get|find)\s+(?:me\s+)?(\w+)\s+where\s+(\w+)\s*[<]\s*(\d+)', 'less'),
-        (r'(give|show|get|find)\s+(?:me\s+)?(\w+)\s+where\s+(\w+)\s*=\s*(\d+)', 'equal'),
-    ]
-    
-    for pattern, comparison in where_patterns:
-        match = re.search(pattern, query)
-        if match:
-            select_col = match.group(2)
-            filter_col = match.group(3)
-            threshold = float(match.group(4))
-            
-            # Find matching columns (case-insensitive)
-            select_column = None
-            filter_column = None
-            
-            for col in all_cols:
-                if col.lower() == select_col.lower() or select_col.lower() in col.lower():
-                    select_column = col
-                if col.lower() == filter_col.lower() or filter_col.lower() in col.lower():
-                    filter_column = col
-            
-            if select_column and filter_column and filter_column in numeric_cols:
-                # Apply filter
-                if comparison == 'greater':
-                    filter_df = df[df[filter_column] > threshold]
-                elif comparison == 'less':
-                    filter_df = df[df[filter_column] < threshold]
-                elif comparison == 'equal':
-                    filter_df = df[df[filter_column] == threshold]
-                
-                count = len(filter_df)
-                
-                # Return the selected column values
-                results = filter_df[select_column].tolist()
-                
-                return jsonify({
-                    "query": query,
-                    "answer": f"{count} rows found where {filter_column} {comparison} than {threshold}",
-                    "type": "conditional_filter",
-                    "count": count,
-                    "column": select_column,
-                    "values": results[:20],  # Limit to 20 values
-                    "details": filter_df[[select_column, filter_column]].to_dict(orient='records')[:10]
-                })
-    
     # === FILTERING QUERIES (SQL-like) ===
     # Example: "how many people with name starting with a"
     filter_df = df.copy()
@@ -482,7 +516,7 @@ def handle_query_with_rules(df, query):
             if not target_col and categorical_cols:
                 target_col = categorical_cols[0]
             
-            if target_col and df[target_col].dtype == 'object':
+            if target_col and df[target_col].dtype.kind == 'O':
                 filter_df = df[df[target_col].astype(str).str.upper().str.startswith(letter)]
                 filtered = True
                 count = len(filter_df)
@@ -502,7 +536,7 @@ def handle_query_with_rules(df, query):
             if word in ["containing", "with"] and i + 1 < len(words):
                 search_term = words[i + 1]
                 for col in categorical_cols:
-                    if df[col].dtype == 'object':
+                    if df[col].dtype.kind == 'O':
                         filter_df = df[df[col].astype(str).str.contains(search_term, case=False, na=False)]
                         filtered = True
                         break
@@ -527,6 +561,28 @@ def handle_query_with_rules(df, query):
     # Default to first numeric column if none matched
     num_col = matched_col if matched_col in numeric_cols else (numeric_cols[0] if numeric_cols else None)
     
+    # === TOP / BOTTOM N ===
+    # Example: "top 5 students by score", "bottom 3 age"
+    match = re.search(r'\b(top|bottom)\s+(\d+)\s+(.+)$', clean_query)
+    if match:
+        largest = match.group(1) == 'top'
+        n = int(match.group(2))
+        phrase = match.group(3).split(' by ')[-1]
+        col = resolve_column(phrase, numeric_cols) or num_col
+        if col:
+            index = indexes(col) if indexes else None
+            if index is not None:
+                top_df = df.iloc[index.top(n, largest)]
+            else:
+                top_df = df.nlargest(n, col) if largest else df.nsmallest(n, col)
+            
+            return jsonify({
+                "query": query,
+                "answer": f"{match.group(1).capitalize()} {len(top_df)} rows by {col}",
+                "details": top_df.to_dict(orient='records'),
+                "type": "top"
+            })
+    
     # === SUM / TOTAL ===
     if any(k in clean_query for k in ["total", "sum"]):
         if num_col:
@@ -544,8 +600,7 @@ def handle_query_with_rules(df, query):
     # === MAX / HIGHEST ===
     if any(k in clean_query for k in ["highest", "maximum", "max", "largest"]):
         if num_col:
-            max_value = df[num_col].max()
-            rows_with_max = df[df[num_col] == max_value]
+            max_value, rows_with_max = extreme_rows(df, num_col, indexes, largest=True)
             
             label_col = categorical_cols[0] if categorical_cols else None
             if label_col:
@@ -565,8 +620,7 @@ def handle_query_with_rules(df, query):
     # === MIN / LOWEST ===
     if any(k in clean_query for k in ["lowest", "minimum", "min", "smallest"]):
         if num_col:
-            min_value = df[num_col].min()
-            rows_with_min = df[df[num_col] == min_value]
+            min_value, rows_with_min = extreme_rows(df, num_col, indexes, largest=False)
             
             label_col = categorical_cols[0] if categorical_cols else None
             if label_col:
@@ -608,7 +662,7 @@ def handle_query_with_rules(df, query):
     })
 
 
-@app.route('/export-pdf', methods=['POST'])
+@api.route('/export-pdf', methods=['POST'])
 def export_pdf():
     """Generate PDF by capturing screenshot from frontend."""
     print("=== PDF Export Started ===")
@@ -689,5 +743,30 @@ def export_pdf():
         return jsonify({"error": str(e)}), 500
 
 
+def preload():
+    """Import heavy modules up front so forked workers share them."""
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"Warning: could not preload {module}: {e}")
+
+
+def create_app():
+    """Build the Flask app. Heavy imports and the Mongo connection stay lazy."""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'your-secret-key')
+    CORS(app, supports_credentials=True)
+
+    if not os.path.exists(UPLOAD_FOLDER):
+        os.makedirs(UPLOAD_FOLDER)
+
+    app.register_blueprint(api)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8000)
\ No newline at end of file
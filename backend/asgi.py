@@ -0,0 +1,145 @@
+"""
+ASGI serving mode.
+
+The auth and upload routes are async here: request bodies are read without
+holding a thread, Mongo lookups and Google token checks run in the threadpool,
+and pandas parsing runs on a separate executor. Every other route is served
+by the Flask app mounted underneath.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 2
+    SERVING_MODE=asgi gunicorn -c gunicorn.conf.py
+"""
+import asyncio
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app, UPLOAD_FOLDER, register_user, login_user, google_login,
+    user_profile, set_current_file, summarize_upload
+)
+from auth import authenticate
+
+# CPU-bound pandas work runs here so the event loop keeps serving connections
+PANDAS_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv('PANDAS_WORKERS', '2')))
+
+# Threads for requests handed to the mounted Flask app
+WSGI_WORKERS = int(os.getenv('WSGI_WORKERS', '10'))
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+
+def login_required(handler):
+    """Async counterpart of auth.token_required."""
+    async def decorated(request):
+        user, error = await run_in_threadpool(authenticate, request.headers.get('Authorization'))
+        if error:
+            return JSONResponse({'error': error}, status_code=401)
+        return await handler(request, user)
+    return decorated
+
+
+# ==================== AUTH ROUTES ====================
+
+async def register(request):
+    """Register a new user with email and password"""
+    body, status = await run_in_threadpool(register_user, await read_json(request))
+    return JSONResponse(body, status_code=status)
+
+
+async def login(request):
+    """Login with email and password"""
+    body, status = await run_in_threadpool(login_user, await read_json(request))
+    return JSONResponse(body, status_code=status)
+
+
+async def google_auth(request):
+    """Authenticate with Google OAuth"""
+    body, status = await run_in_threadpool(google_login, await read_json(request))
+    return JSONResponse(body, status_code=status)
+
+
+@login_required
+async def get_current_user(request, current_user):
+    """Get current authenticated user"""
+    return JSONResponse(user_profile(current_user))
+
+
+@login_required
+async def logout(request, current_user):
+    """Logout user (client should delete token)"""
+    return JSONResponse({"message": "Logout successful"})
+
+
+# ==================== SPREADSHEET ROUTES ====================
+
+def save_upload(source, filepath):
+    with open(filepath, 'wb') as target:
+        shutil.copyfileobj(source, target)
+
+
+@login_required
+async def upload_file(request, current_user):
+    """Upload and summarize spreadsheet."""
+    # The multipart body is read asynchronously, so slow clients don't hold a thread
+    async with request.form() as form:
+        file = form.get('file')
+        if not isinstance(file, UploadFile):
+            return JSONResponse({"error": "No file uploaded"}, status_code=400)
+
+        filepath = os.path.join(UPLOAD_FOLDER, file.filename)
+        await run_in_threadpool(save_upload, file.file, filepath)
+
+    # Set this as the current active file
+    set_current_file(filepath)
+
+    try:
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(PANDAS_EXECUTOR, summarize_upload, filepath)
+        return JSONResponse(summary)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    PANDAS_EXECUTOR.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/auth/register', register, methods=['POST']),
+        Route('/auth/login', login, methods=['POST']),
+        Route('/auth/google', google_auth, methods=['POST']),
+        Route('/auth/me', get_current_user, methods=['GET']),
+        Route('/auth/logout', logout, methods=['POST']),
+        Route('/upload', upload_file, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_WORKERS)),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origin_regex='.*',
+            allow_credentials=True,
+            allow_methods=['*'],
+            allow_headers=['*'],
+        ),
+    ],
+    lifespan=lifespan,
+)
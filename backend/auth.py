@@ -42,34 +42,41 @@ def decode_token(token):
     except jwt.InvalidTokenError:
         return None
 
+def authenticate(auth_header):
+    """Resolve an Authorization header to a user. Returns (user, error)."""
+    if not auth_header:
+        return None, 'Token is missing'
+    
+    try:
+        token = auth_header.split(' ')[1]  # Bearer <token>
+    except IndexError:
+        return None, 'Invalid token format'
+    
+    if not token:
+        return None, 'Token is missing'
+    
+    # Verify token
+    payload = decode_token(token)
+    if not payload:
+        return None, 'Token is invalid or expired'
+    
+    # Get user from database
+    users_collection = get_users_collection()
+    user = users_collection.find_one({'email': payload['email']})
+    
+    if not user:
+        return None, 'User not found'
+    
+    return user, None
+
 def token_required(f):
     """Decorator to protect routes with JWT authentication"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
         # Get token from Authorization header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-            except IndexError:
-                return jsonify({'error': 'Invalid token format'}), 401
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        
-        # Verify token
-        payload = decode_token(token)
-        if not payload:
-            return jsonify({'error': 'Token is invalid or expired'}), 401
-        
-        # Get user from database
-        users_collection = get_users_collection()
-        user = users_collection.find_one({'email': payload['email']})
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 401
+        user, error = authenticate(request.headers.get('Authorization'))
+        if error:
+            return jsonify({'error': error}), 401
         
         # Pass user to route
         return f(current_user=user, *args, **kwargs)
@@ -0,0 +1,67 @@
+"""
+Measure worker startup cost.
+
+Times `import app` in a fresh interpreter and uses -X importtime to show
+which packages the time goes to. --preload also imports everything
+app.preload() loads, i.e. the cost paid once in the gunicorn master.
+
+Usage: python benchmark_startup.py [--top 15] [--preload]
+"""
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def import_times(statement):
+    """Import time (microseconds) per top-level package, summed over its modules."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else 'import failed')
+
+    totals = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # Self time, so nested imports are charged to their own package
+        self_us, _, name = line.split('|')
+        totals[name.strip().split('.')[0]] += int(self_us.split(':')[1])
+    return totals
+
+
+def wall_time(statement, runs=3):
+    """Best wall-clock time (seconds) for running statement in a new interpreter."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], capture_output=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--top', type=int, default=15, help='number of modules to show')
+    parser.add_argument('--preload', action='store_true', help='also import the modules preload() loads')
+    args = parser.parse_args()
+
+    statement = 'import app; app.preload()' if args.preload else 'import app'
+
+    print(f"Statement: {statement}")
+    print(f"Interpreter only: {wall_time('pass') * 1000:.0f} ms")
+    print(f"Startup:          {wall_time(statement) * 1000:.0f} ms")
+    print()
+
+    totals = import_times(statement)
+    print(f"{'package':<30}{'import ms':>15}")
+    for name, micros in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<30}{micros / 1000:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
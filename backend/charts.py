@@ -0,0 +1,309 @@
+"""
+Chart data for the dashboard.
+
+Every column is converted once and all statistics and charts for it are
+derived from that single conversion: categorical value counts feed both the
+bar and pie charts, and a numeric array feeds its stats, histogram and the
+trend line. The trend line covers the whole column, downsampled on the
+server to a point budget with LTTB (largest triangle three buckets) or
+min/max bucketing. Date columns get time buckets sized to their span.
+Results are cached per dataset version.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_POINT_BUDGET = int(os.getenv('CHART_POINT_BUDGET', '500'))
+MIN_POINT_BUDGET = 10
+MAX_POINT_BUDGET = 5000
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+MAX_STATS_COLUMNS = 5
+MAX_BAR_CHARTS = 3
+MAX_HISTOGRAMS = 3
+MAX_BINS = 30
+MAX_TIME_BUCKETS = 100
+DATE_SNIFF_ROWS = 100
+
+# (pandas frequency, label, approximate length), finest first
+TIME_UNITS = [
+    ('h', 'hour', pd.Timedelta(hours=1)),
+    ('D', 'day', pd.Timedelta(days=1)),
+    ('W', 'week', pd.Timedelta(weeks=1)),
+    ('MS', 'month', pd.Timedelta(days=30.44)),
+    ('QS', 'quarter', pd.Timedelta(days=91.31)),
+    ('YS', 'year', pd.Timedelta(days=365.25)),
+]
+
+MAX_CACHED_DASHBOARDS = 8
+
+# (dataset key, point budget, method) -> dashboard, least recently used first
+_dashboards = OrderedDict()
+_dashboards_lock = threading.Lock()
+
+
+def lttb(x, y, threshold):
+    """Indices of the points kept by largest-triangle-three-buckets."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    kept = np.empty(threshold, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+    # Inner points split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+            avg_x, avg_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        px, py = x[previous], y[previous]
+        areas = np.abs((px - avg_x) * (y[start:stop] - py) - (px - x[start:stop]) * (avg_y - py))
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def minmax_buckets(y, threshold):
+    """Indices of the min and max of each bucket, in x order."""
+    n = len(y)
+    buckets = max(threshold // 2, 1)
+    if n <= threshold:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.intp)
+    kept = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop <= start:
+            continue
+        chunk = y[start:stop]
+        low, high = start + int(np.argmin(chunk)), start + int(np.argmax(chunk))
+        kept.extend(sorted({low, high}))
+    return np.asarray(kept, dtype=np.intp)
+
+
+def downsample(x, y, point_budget, method='lttb'):
+    """Indices into x/y to keep so at most point_budget points are drawn."""
+    if method == 'minmax':
+        return minmax_buckets(y, point_budget)
+    return lttb(x, y, point_budget)
+
+
+def _as_dates(series):
+    """Parsed dates if the column holds dates, otherwise None."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    # Text is object or Arrow-backed string dtype, both of kind 'O'
+    if series.dtype.kind != 'O':
+        return None
+    sample = series.dropna().head(DATE_SNIFF_ROWS).astype(str)
+    # Plain numbers parse as dates too; require something date-like
+    if sample.empty or not sample.str.contains(r'[-/:]').all():
+        return None
+    if pd.to_datetime(sample, errors='coerce').notna().mean() < 0.9:
+        return None
+    return pd.to_datetime(series, errors='coerce')
+
+
+def _numeric_stats(values):
+    return {
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": float(values.mean()),
+        "median": float(np.median(values)),
+        "sum": float(values.sum()),
+        "std": float(values.std(ddof=1)) if len(values) > 1 else 0
+    }
+
+
+def _auto_bin_count(values):
+    """
+    Bin count numpy's 'auto' rule would pick (max of Sturges and
+    Freedman-Diaconis), worked out without building the bins: one outlier
+    can make the auto rule allocate billions of edges.
+    """
+    n = len(values)
+    span = values.max() - values.min()
+    if span == 0:
+        return 1
+    sturges = np.log2(n) + 1
+    q75, q25 = np.percentile(values, [75, 25])
+    fd_width = 2.0 * (q75 - q25) * n ** (-1 / 3)
+    if fd_width <= 0:
+        return int(np.ceil(sturges))
+    # Only the comparison with MAX_BINS matters, so cap before converting
+    return int(np.ceil(min(max(span / fd_width, sturges), MAX_BINS + 1)))
+
+
+def _histogram(col, values):
+    bins = min(_auto_bin_count(values), MAX_BINS)
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        "type": "bar",
+        "title": f"Histogram of {col}",
+        "column": col,
+        "labels": [f"{round(float(lo), 2)} – {round(float(hi), 2)}" for lo, hi in zip(edges[:-1], edges[1:])],
+        "data": counts.tolist(),
+        "bins": edges.tolist()
+    }
+
+
+def _trend(col, values, dates, date_col, point_budget, method):
+    """Trend of a numeric column over the full data, by date when there is one."""
+    if dates is not None:
+        valid = np.isfinite(values) & dates.notna().to_numpy()
+        stamps = dates.to_numpy()[valid]
+        order = np.argsort(stamps, kind='stable')
+        stamps, y = stamps[order], values[valid][order]
+        x = stamps.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    else:
+        positions = np.flatnonzero(np.isfinite(values))
+        x, y = positions.astype(np.float64), values[positions]
+
+    kept = downsample(x, y, point_budget, method) if len(y) else np.arange(0)
+    if dates is not None:
+        labels = [str(pd.Timestamp(stamp)) for stamp in stamps[kept]]
+    else:
+        labels = (x[kept].astype(np.int64) + 1).tolist()
+
+    return {
+        "type": "line",
+        "title": f"Trend of {col}" + (f" by {date_col}" if dates is not None else ""),
+        "column": col,
+        "x_column": date_col if dates is not None else None,
+        "labels": labels,
+        "data": y[kept].tolist(),
+        "points": int(len(kept)),
+        "total_points": int(len(y)),
+        "downsample": method if len(kept) < len(y) else None
+    }
+
+
+def _time_buckets(col, dates, point_budget):
+    """Row counts per hour/day/week/... picked so the buckets fit the budget."""
+    dates = dates.dropna()
+    if dates.empty:
+        return None
+    span = dates.max() - dates.min()
+    limit = min(point_budget, MAX_TIME_BUCKETS)
+    freq, unit = TIME_UNITS[-1][:2]
+    for candidate, label, length in TIME_UNITS:
+        if span / length + 1 <= limit:
+            freq, unit = candidate, label
+            break
+
+    counts = pd.Series(1, index=pd.DatetimeIndex(dates)).resample(freq).size()
+    return {
+        "type": "bar",
+        "title": f"Rows per {unit} of {col}",
+        "column": col,
+        "labels": [stamp.date().isoformat() if unit != 'hour' else stamp.isoformat() for stamp in counts.index],
+        "data": counts.values.tolist(),
+        "bucket": unit
+    }
+
+
+def _category_chart(chart_type, title, col, counts, limit):
+    top = counts.head(limit)
+    return {
+        "type": chart_type,
+        "title": f"{title} {col}",
+        "column": col,
+        "labels": [str(x) for x in top.index.tolist()],
+        "data": top.values.tolist()
+    }
+
+
+def build_dashboard_data(df, point_budget=DEFAULT_POINT_BUDGET, method='lttb'):
+    """Numeric stats and chart data for df, from one pass over its columns."""
+    numeric_stats = {}
+    bar_charts, histograms = [], []
+    trend_column = trend_values = None
+    date_column = dates = None
+    pie_chart = None
+
+    for col in df.columns:
+        series = df[col]
+
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            values = series.to_numpy(dtype='float64', na_value=np.nan)
+            finite = values[np.isfinite(values)]
+            if not len(finite):
+                continue
+            if len(numeric_stats) < MAX_STATS_COLUMNS:
+                numeric_stats[col] = _numeric_stats(finite)
+            if len(histograms) < MAX_HISTOGRAMS:
+                histograms.append(_histogram(col, finite))
+            if trend_column is None:
+                trend_column, trend_values = col, values
+            continue
+
+        if date_column is None:
+            parsed = _as_dates(series)
+            if parsed is not None:
+                date_column, dates = col, parsed
+                continue
+
+        if len(bar_charts) < MAX_BAR_CHARTS or pie_chart is None:
+            # Convert to string to handle datetime and other special types
+            counts = series.astype(str).value_counts()
+            if len(counts) == 0:
+                continue
+            if len(bar_charts) < MAX_BAR_CHARTS:
+                bar_charts.append(_category_chart("bar", "Distribution of", col, counts, 10))
+            if pie_chart is None:
+                pie_chart = _category_chart("pie", "Composition of", col, counts, 5)
+
+    charts = bar_charts + histograms
+    if trend_column is not None:
+        charts.append(_trend(trend_column, trend_values, dates, date_column, point_budget, method))
+    if date_column is not None:
+        bucket_chart = _time_buckets(date_column, dates, point_budget)
+        if bucket_chart:
+            charts.append(bucket_chart)
+    if pie_chart is not None:
+        charts.append(pie_chart)
+
+    return numeric_stats, charts
+
+
+def chart_options(data):
+    """Point budget and downsampling method from a request body."""
+    data = data or {}
+    try:
+        point_budget = int(data.get('points', DEFAULT_POINT_BUDGET))
+    except (TypeError, ValueError):
+        point_budget = DEFAULT_POINT_BUDGET
+    point_budget = min(max(point_budget, MIN_POINT_BUDGET), MAX_POINT_BUDGET)
+
+    method = data.get('downsample', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        method = 'lttb'
+    return point_budget, method
+
+
+def get_cached_dashboard(key):
+    if key is None:
+        return None
+    with _dashboards_lock:
+        dashboard = _dashboards.get(key)
+        if dashboard is not None:
+            _dashboards.move_to_end(key)
+        return dashboard
+
+
+def cache_dashboard(key, dashboard):
+    if key is None:
+        return
+    with _dashboards_lock:
+        _dashboards[key] = dashboard
+        _dashboards.move_to_end(key)
+        while len(_dashboards) > MAX_CACHED_DASHBOARDS:
+            _dashboards.popitem(last=False)
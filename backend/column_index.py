@@ -0,0 +1,207 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+BLOCK_SIZE = 4096
+MAX_INDEXED_DATASETS = 4
+
+RANGE_OPS = ('>', '>=', '<', '<=', '=', '!=')
+
+# Scatter the binary-search slice into a mask when at most this share of
+# rows match; random writes lose to a sequential comparison beyond it
+SCATTER_FRACTION = 0.05
+# Use the zone maps only when at most this share of blocks is undecided
+ZONE_MAP_FRACTION = 0.25
+
+
+def _compare(values, op, value):
+    if op == '>':
+        return values > value
+    if op == '>=':
+        return values >= value
+    if op == '<':
+        return values < value
+    if op == '<=':
+        return values <= value
+    return values == value
+
+
+def _runs(flags):
+    """(first, last) block numbers of each run of consecutive True flags."""
+    edges = np.diff(np.concatenate(([0], flags.astype(np.int8), [0])))
+    return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1)
+
+
+class NumericIndex:
+    """
+    Read-only index over one numeric column.
+
+    Keeps an argsort permutation (NaNs excluded) for binary-search lookups
+    and per-block min/max zone maps for building filter masks without
+    comparing every row.
+    """
+
+    def __init__(self, series, block_size=BLOCK_SIZE):
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        nan_mask = np.isnan(values)
+
+        order = np.argsort(values, kind='stable')
+        self.order = order[:len(values) - int(nan_mask.sum())]
+        self.sorted_values = values[self.order]
+        self.values = values
+        self.size = len(values)
+
+        self.block_size = block_size
+        self.block_starts = np.arange(0, self.size, block_size)
+        if self.size:
+            self.block_mins = np.fmin.reduceat(values, self.block_starts)
+            self.block_maxs = np.fmax.reduceat(values, self.block_starts)
+            self.block_has_nan = np.add.reduceat(nan_mask, self.block_starts) > 0
+        else:
+            self.block_mins = self.block_maxs = np.empty(0)
+            self.block_has_nan = np.empty(0, dtype=bool)
+
+    def _bounds(self, op, value):
+        """Slice of sorted_values matching the comparison."""
+        sv = self.sorted_values
+        if op == '>':
+            return np.searchsorted(sv, value, 'right'), len(sv)
+        if op == '>=':
+            return np.searchsorted(sv, value, 'left'), len(sv)
+        if op == '<':
+            return 0, np.searchsorted(sv, value, 'left')
+        if op == '<=':
+            return 0, np.searchsorted(sv, value, 'right')
+        if op == '=':
+            return np.searchsorted(sv, value, 'left'), np.searchsorted(sv, value, 'right')
+        raise ValueError(f"Unsupported operator for index lookup: {op}")
+
+    def count(self, op, value):
+        """Number of rows matching the comparison, via binary search."""
+        if op == '!=':
+            return self.size - self.count('=', value)
+        lo, hi = self._bounds(op, value)
+        return int(hi - lo)
+
+    def positions(self, op, value):
+        """Row positions (in original order) matching the comparison."""
+        if op == '!=':
+            return np.flatnonzero(self.mask(op, value))
+        lo, hi = self._bounds(op, value)
+        return np.sort(self.order[lo:hi])
+
+    def mask(self, op, value):
+        """
+        Boolean mask for the comparison. Selective comparisons scatter the
+        binary-search slice into the mask. Otherwise, when the zone maps
+        settle most blocks (clustered or sorted data), whole blocks are
+        filled or skipped and only the undecided runs are compared; when they
+        don't, one vectorized comparison over the column is cheapest.
+        """
+        if op == '!=':
+            return ~self.mask('=', value)
+
+        lo, hi = self._bounds(op, value)
+        if hi - lo <= self.size * SCATTER_FRACTION:
+            result = np.zeros(self.size, dtype=bool)
+            result[self.order[lo:hi]] = True
+            return result
+
+        mins, maxs = self.block_mins, self.block_maxs
+        with np.errstate(invalid='ignore'):
+            if op == '>':
+                full, maybe = mins > value, maxs > value
+            elif op == '>=':
+                full, maybe = mins >= value, maxs >= value
+            elif op == '<':
+                full, maybe = maxs < value, mins < value
+            elif op == '<=':
+                full, maybe = maxs <= value, mins <= value
+            else:
+                full = (mins == value) & (maxs == value)
+                maybe = (mins <= value) & (maxs >= value)
+        full &= ~self.block_has_nan
+        undecided = maybe & ~full
+
+        if undecided.sum() > len(undecided) * ZONE_MAP_FRACTION:
+            # Unclustered data: the zone maps prune too little to pay off
+            return _compare(self.values, op, value)
+
+        result = np.zeros(self.size, dtype=bool)
+        for first, last in _runs(full):
+            result[self.block_starts[first]:self._block_stop(last)] = True
+        for first, last in _runs(undecided):
+            start, stop = self.block_starts[first], self._block_stop(last)
+            result[start:stop] = _compare(self.values[start:stop], op, value)
+        return result
+
+    def _block_stop(self, block):
+        return min(self.block_starts[block] + self.block_size, self.size)
+
+    def extreme(self, largest=True):
+        """Return (value, row positions of every tied row) for the max or min."""
+        if not len(self.sorted_values):
+            return None, np.empty(0, dtype=np.intp)
+        value = self.sorted_values[-1] if largest else self.sorted_values[0]
+        return float(value), self.positions('=', value)
+
+    def top(self, n, largest=True):
+        """Row positions of the n largest (or smallest) values, best first."""
+        if not largest:
+            return self.order[:n]
+        if n <= 0 or not len(self.sorted_values):
+            return self.order[:0]
+        # Ties on the cut-off value keep their original row order, like nlargest
+        cutoff = self.sorted_values[-min(n, len(self.sorted_values))]
+        candidates = self.order[np.searchsorted(self.sorted_values, cutoff, 'left'):]
+        candidates = candidates[np.lexsort((candidates, -self.values[candidates]))]
+        return candidates[:n]
+
+
+# dataset key -> {column: NumericIndex}, least recently used first
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_numeric_index(dataset_key, df, column):
+    """
+    Return the cached index for a column of a dataset, building it on first use.
+    Returns None without a dataset key: a one-off index costs more than a scan.
+    """
+    if dataset_key is None or column not in df.columns:
+        return None
+
+    with _indexes_lock:
+        columns = _indexes.get(dataset_key)
+        if columns is not None:
+            _indexes.move_to_end(dataset_key)
+            if column in columns:
+                return columns[column]
+
+    index = NumericIndex(df[column])
+
+    with _indexes_lock:
+        columns = _indexes.setdefault(dataset_key, {})
+        columns.setdefault(column, index)
+        _indexes.move_to_end(dataset_key)
+        while len(_indexes) > MAX_INDEXED_DATASETS:
+            _indexes.popitem(last=False)
+        return columns[column]
+
+
+def index_lookup(dataset_key, df):
+    """Build a column -> NumericIndex lookup bound to one dataset."""
+    if dataset_key is None:
+        return None
+    return lambda column: get_numeric_index(dataset_key, df, column)
+
+
+def drop_indexes(dataset_key=None):
+    """Forget the indexes of one dataset, or of all datasets."""
+    with _indexes_lock:
+        if dataset_key is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(dataset_key, None)
@@ -1,6 +1,6 @@
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
+import threading
 
 load_dotenv()
 
@@ -8,22 +8,28 @@ load_dotenv()
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'spreadsheet_manager')
 
-client = MongoClient(MONGODB_URI)
-db = client[DATABASE_NAME]
-
-# Collections
-users_collection = db['users']
-sessions_collection = db['sessions']
-
-# Create indexes
-users_collection.create_index('email', unique=True)
-users_collection.create_index('google_id', unique=True, sparse=True)
+# The client is created on first use rather than at import, so the app can be
+# preloaded before gunicorn forks without sharing a Mongo connection
+_client = None
+_client_lock = threading.Lock()
 
 def get_db():
-    return db
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from pymongo import MongoClient
+                client = MongoClient(MONGODB_URI)
+                db = client[DATABASE_NAME]
+
+                # Create indexes
+                db['users'].create_index('email', unique=True)
+                db['users'].create_index('google_id', unique=True, sparse=True)
+                _client = client
+    return _client[DATABASE_NAME]
 
 def get_users_collection():
-    return users_collection
+    return get_db()['users']
 
 def get_sessions_collection():
-    return sessions_collection
+    return get_db()['sessions']
@@ -0,0 +1,165 @@
+"""
+Google ID token verification with a cached signing-key set.
+
+google.oauth2.id_token.verify_oauth2_token downloads Google's certificates on
+every call. Here they are fetched through a pooled HTTP session, kept until
+the expiry given by the response's Cache-Control/Expires headers, and
+refreshed by one thread at a time. Tokens signed by a key that is not cached
+(Google rotated its keys) trigger a single early refresh.
+
+The key source is pluggable: set GOOGLE_CERTS_FILE to a JSON file of
+{"kid": "<PEM certificate>"} to verify tokens from a stand-in issuer in tests
+or offline environments, or call set_key_source() with any callable that
+returns (certs, max_age_seconds).
+"""
+import base64
+import json
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from google.auth import jwt as google_jwt
+from requests.adapters import HTTPAdapter
+
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+GOOGLE_CERTS_FILE = os.getenv('GOOGLE_CERTS_FILE')
+GOOGLE_ISSUERS = os.getenv('GOOGLE_TOKEN_ISSUERS', 'accounts.google.com,https://accounts.google.com').split(',')
+
+DEFAULT_MAX_AGE = 3600
+# Unknown key ids force a refresh at most this often, so forged tokens
+# can't turn every login into a certificate download
+MIN_REFRESH_INTERVAL = 60
+CLOCK_SKEW_SECONDS = 0
+HTTP_TIMEOUT = 5
+
+_session = None
+_key_source = None
+_certs = {}
+_certs_expire_at = 0
+_certs_fetched_at = 0
+_certs_lock = threading.Lock()
+
+
+def get_session():
+    """Shared HTTP session, so certificate fetches reuse pooled connections."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _session = session
+    return _session
+
+
+def parse_max_age(headers):
+    """Seconds a response may be cached for, from Cache-Control or Expires."""
+    cache_control = headers.get('Cache-Control', '')
+    match = re.search(r'max-age=(\d+)', cache_control)
+    if match:
+        return max(int(match.group(1)) - int(headers.get('Age', 0) or 0), 0)
+
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return max(parsedate_to_datetime(expires).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            pass
+    return DEFAULT_MAX_AGE
+
+
+def fetch_google_certs():
+    """Download Google's signing certificates. Returns (certs, max_age)."""
+    response = get_session().get(GOOGLE_CERTS_URL, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    return response.json(), parse_max_age(response.headers)
+
+
+def file_key_source(path):
+    """Key source reading {"kid": "<PEM certificate>"} from a local file."""
+    def load():
+        with open(path) as f:
+            return json.load(f), DEFAULT_MAX_AGE
+    return load
+
+
+def set_key_source(source):
+    """Replace where signing keys come from and drop the cached ones."""
+    global _key_source, _certs, _certs_expire_at, _certs_fetched_at
+    with _certs_lock:
+        _key_source = source
+        _certs = {}
+        _certs_expire_at = 0
+        _certs_fetched_at = 0
+
+
+def get_key_source():
+    if _key_source is not None:
+        return _key_source
+    if GOOGLE_CERTS_FILE:
+        return file_key_source(GOOGLE_CERTS_FILE)
+    return fetch_google_certs
+
+
+def get_certs(force_refresh=False):
+    """Cached signing certificates, refreshed once they expire."""
+    global _certs, _certs_expire_at, _certs_fetched_at
+    if not force_refresh and _certs and time.time() < _certs_expire_at:
+        return _certs
+
+    seen = _certs
+    with _certs_lock:
+        now = time.time()
+        fresh = _certs and now < _certs_expire_at
+        # Another thread may have refreshed while we waited for the lock
+        if fresh and (not force_refresh or _certs is not seen
+                      or now - _certs_fetched_at < MIN_REFRESH_INTERVAL):
+            return _certs
+        try:
+            certs, max_age = get_key_source()()
+        except Exception as e:
+            if not _certs:
+                raise
+            # Keep serving the previous keys for a while if the refresh fails
+            print(f"Warning: could not refresh Google certificates: {e}")
+            _certs_expire_at = now + MIN_REFRESH_INTERVAL
+            return _certs
+        _certs = certs
+        _certs_fetched_at = now
+        _certs_expire_at = now + max_age
+        return _certs
+
+
+def _key_id(token):
+    """Key id from the token header, read before the signature is checked."""
+    try:
+        segment = token.split('.')[0]
+        header = json.loads(base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4)))
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError('Malformed token')
+    return header.get('kid') if isinstance(header, dict) else None
+
+
+def verify_google_id_token(token, audience):
+    """
+    Verify a Google ID token and return its claims, like
+    id_token.verify_oauth2_token. Raises ValueError if the token is invalid.
+    """
+    certs = get_certs()
+    key_id = _key_id(token)
+    if key_id and key_id not in certs:
+        certs = get_certs(force_refresh=True)
+
+    idinfo = google_jwt.decode(
+        token,
+        certs=certs,
+        audience=audience,
+        clock_skew_in_seconds=CLOCK_SKEW_SECONDS
+    )
+
+    if idinfo.get('iss') not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}")
+    return idinfo
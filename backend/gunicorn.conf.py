@@ -0,0 +1,23 @@
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+# Load the app once in the master and fork workers from it, so imports are
+# paid once and shared copy-on-write. Set GUNICORN_PRELOAD=0 to disable.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# SERVING_MODE=asgi serves asgi:app (async auth/upload routes) on uvicorn workers
+if os.getenv('SERVING_MODE') == 'asgi':
+    wsgi_app = 'asgi:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:app'
+
+
+def when_ready(server):
+    """Import heavy modules in the master before the first worker is forked."""
+    if preload_app:
+        from app import preload
+        preload()
@@ -0,0 +1,415 @@
+import re
+import pandas as pd
+
+from column_index import RANGE_OPS
+
+# Natural language keyword -> pandas aggregation name
+AGGREGATIONS = [
+    ('how many', 'count'),
+    ('number of', 'count'),
+    ('count', 'count'),
+    ('average', 'mean'),
+    ('avg', 'mean'),
+    ('mean', 'mean'),
+    ('median', 'median'),
+    ('total', 'sum'),
+    ('sum', 'sum'),
+    ('highest', 'max'),
+    ('maximum', 'max'),
+    ('largest', 'max'),
+    ('max', 'max'),
+    ('lowest', 'min'),
+    ('minimum', 'min'),
+    ('smallest', 'min'),
+    ('min', 'min'),
+]
+
+AGGREGATION_LABELS = {
+    'count': 'Count',
+    'mean': 'Average',
+    'median': 'Median',
+    'sum': 'Total',
+    'max': 'Highest',
+    'min': 'Lowest',
+}
+
+# Comparison phrases, longest first so the regex prefers the most specific one
+OPERATORS = [
+    ('greater than or equal to', '>='),
+    ('less than or equal to', '<='),
+    ('not equal to', '!='),
+    ('greater than', '>'),
+    ('more than', '>'),
+    ('higher than', '>'),
+    ('less than', '<'),
+    ('lower than', '<'),
+    ('smaller than', '<'),
+    ('at least', '>='),
+    ('at most', '<='),
+    ('equal to', '='),
+    ('equals', '='),
+    ('equal', '='),
+    ('contains', 'contains'),
+    ('containing', 'contains'),
+    ('is not', '!='),
+    ('above', '>'),
+    ('below', '<'),
+    ('after', '>'),
+    ('before', '<'),
+    ('is', '='),
+    ('>=', '>='),
+    ('<=', '<='),
+    ('!=', '!='),
+    ('<>', '!='),
+    ('==', '='),
+    ('>', '>'),
+    ('<', '<'),
+    ('=', '='),
+]
+
+OPERATOR_WORDS = {
+    '>': 'greater than',
+    '<': 'less than',
+    '>=': 'at least',
+    '<=': 'at most',
+    '=': 'equal to',
+    '!=': 'not equal to',
+    'contains': 'containing',
+}
+
+SELECT_VERBS = r'(?:please\s+)?(?:give|show|get|find|list|display|return)\s+(?:me\s+)?(?:the\s+|all\s+)?'
+GROUP_SPLIT = r'\s+(?:(?:group(?:ed)?\s+)?by|per|for each)\s+'
+NUMBER_RE = re.compile(r'^-?\d+(?:\.\d+)?$')
+DATE_RE = re.compile(r'^(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{4})$')
+ROW_WORDS = {'rows', 'row', 'records', 'record', 'entries', 'everything', 'all', '*'}
+
+MAX_GROUPS = 50
+
+# Symbolic operators are tried first so "amount after tax > 5" splits on ">"
+_CONDITION_RES = [
+    re.compile(
+        r'^(?P<column>.+?)\s*(?:\bis\s+)?(?P<op>'
+        + '|'.join(r'\b' + re.escape(phrase) + r'\b' if words else re.escape(phrase)
+                   for phrase, _ in OPERATORS if phrase[0].isalpha() == words)
+        + r')\s*(?P<value>.+)$'
+    )
+    for words in (False, True)
+]
+_OPERATOR_LOOKUP = dict(OPERATORS)
+
+
+def _normalize(name):
+    return re.sub(r'[\s_]+', ' ', str(name).lower()).strip()
+
+
+def resolve_column(phrase, columns):
+    """Match a phrase from the query to a column name (case-insensitive)."""
+    words = _normalize(phrase).split()
+    # Drop trailing words one at a time, e.g. "codolio score" -> "codolio"
+    while words:
+        name = ' '.join(words)
+        candidates = [name]
+        if name.endswith('s'):
+            candidates.append(name[:-1])
+
+        for candidate in candidates:
+            for col in columns:
+                if _normalize(col) == candidate:
+                    return col
+        for candidate in candidates:
+            for col in columns:
+                if candidate in _normalize(col):
+                    return col
+        words = words[:-1]
+    return None
+
+
+def _split_list(text):
+    return [part.strip() for part in re.split(r'\s*,\s*|\s+and\s+', text) if part.strip()]
+
+
+def parse_literal(text):
+    """Turn a literal from the query into a (kind, value) pair."""
+    text = text.strip().strip('\'"').strip()
+    if NUMBER_RE.match(text):
+        return 'number', float(text)
+    if DATE_RE.match(text):
+        parsed = pd.to_datetime(text, errors='coerce', dayfirst='/' in text)
+        if not pd.isna(parsed):
+            return 'date', parsed
+    return 'text', text
+
+
+def parse_conditions(text, columns):
+    """
+    Parse a WHERE clause into OR-groups of AND-ed conditions.
+    AND binds tighter than OR, e.g. "a > 1 and b = x or c < 2"
+    becomes [[a > 1, b = x], [c < 2]].
+    """
+    groups = []
+    for or_part in re.split(r'\s+or\s+', text.strip()):
+        conditions = []
+        for part in re.split(r'\s+and\s+', or_part):
+            match = None
+            for condition_re in _CONDITION_RES:
+                match = condition_re.match(part.strip())
+                if match:
+                    break
+            if not match:
+                return None
+            column = resolve_column(match.group('column'), columns)
+            if not column:
+                return None
+            op = _OPERATOR_LOOKUP[match.group('op')]
+            kind, value = parse_literal(match.group('value'))
+            if op == 'contains':
+                # "phone contains 555" is a text search whatever the literal looks like
+                kind, value = 'text', match.group('value').strip().strip('\'"').strip()
+            elif kind == 'text' and op not in ('=', '!='):
+                # Text can't be ordered; leave the query to the keyword rules
+                return None
+            conditions.append({
+                'column': column,
+                'op': op,
+                'kind': kind,
+                'value': value,
+            })
+        groups.append(conditions)
+    return groups
+
+
+def compile_query(query, columns):
+    """
+    Compile a query with a WHERE clause and/or a group-by into a spec dict.
+    Returns None when the query is not in a shape this engine understands,
+    so the caller can fall back to the simpler keyword rules.
+    """
+    query = query.strip().rstrip('?.!').strip()
+    head, where_text = query, ''
+    if re.search(r'\swhere\s', query):
+        head, where_text = re.split(r'\s+where\s+', query, maxsplit=1)
+
+    group_text = ''
+    head_parts = re.split(GROUP_SPLIT, head, maxsplit=1)
+    if len(head_parts) == 2:
+        head, group_text = head_parts
+    elif where_text:
+        where_parts = re.split(GROUP_SPLIT, where_text, maxsplit=1)
+        if len(where_parts) == 2:
+            where_text, group_text = where_parts
+
+    if not where_text and not group_text:
+        return None
+
+    conditions = []
+    if where_text:
+        conditions = parse_conditions(where_text, columns)
+        if conditions is None:
+            return None
+
+    group_by = []
+    for phrase in _split_list(group_text):
+        column = resolve_column(phrase, columns)
+        if not column:
+            return None
+        group_by.append(column)
+
+    spec = {'conditions': conditions, 'group_by': group_by}
+
+    # Aggregation, e.g. "average salary and bonus by department".
+    # The earliest keyword in the query wins.
+    found = None
+    for keyword, func in AGGREGATIONS:
+        match = re.search(r'\b' + keyword + r'\b\s*(?:of\s+)?(?:the\s+)?(.*)$', head)
+        if match and (found is None or match.start() < found[0].start()):
+            found = (match, func)
+    if found:
+        match, func = found
+        targets = []
+        for phrase in _split_list(match.group(1)):
+            if phrase in ROW_WORDS:
+                continue
+            column = resolve_column(phrase, columns)
+            if column and column not in targets and column not in group_by:
+                targets.append(column)
+        if func != 'count' and not targets:
+            return None
+        spec.update({'mode': 'aggregate', 'aggregation': func, 'targets': targets})
+        return spec
+
+    # Row selection, e.g. "give me fullname and city where age > 30"
+    match = re.match(SELECT_VERBS + r'(.+)$', head)
+    if match and not group_by:
+        phrase = match.group(1).strip()
+        if phrase in ROW_WORDS:
+            select = []
+        else:
+            select = [resolve_column(p, columns) for p in _split_list(phrase)]
+            if not all(select):
+                return None
+        spec.update({'mode': 'select', 'select': select})
+        return spec
+
+    return None
+
+
+def _single_numeric_condition(conditions):
+    if len(conditions) == 1 and len(conditions[0]) == 1 and conditions[0][0]['kind'] == 'number':
+        return conditions[0][0]
+    return None
+
+
+def _condition_mask(df, condition, index_lookup=None):
+    series = df[condition['column']]
+    op, kind, value = condition['op'], condition['kind'], condition['value']
+
+    if kind == 'number' and index_lookup and op in RANGE_OPS:
+        index = index_lookup(condition['column'])
+        if index is not None:
+            return index.mask(op, value)
+
+    if kind == 'number':
+        series = pd.to_numeric(series, errors='coerce')
+    elif kind == 'date':
+        series = pd.to_datetime(series, errors='coerce')
+    else:
+        series = series.astype(str).str.lower()
+        value = value.lower()
+        if op == 'contains':
+            return series.str.contains(value, regex=False, na=False)
+        if op not in ('=', '!='):
+            raise ValueError(f"Cannot compare text column {condition['column']} with '{OPERATOR_WORDS[op]}'")
+
+    if op == '>':
+        return series > value
+    if op == '<':
+        return series < value
+    if op == '>=':
+        return series >= value
+    if op == '<=':
+        return series <= value
+    if op == '=':
+        return series == value
+    if op == '!=':
+        return series != value
+    raise ValueError(f"Operator '{OPERATOR_WORDS[op]}' is only supported for text columns")
+
+
+def build_mask(df, conditions, index_lookup=None):
+    """
+    Combine all conditions into a single boolean mask over df.
+    Numeric comparisons use the column's zone maps when index_lookup
+    returns an index for it.
+    """
+    mask = None
+    for group in conditions:
+        group_mask = None
+        for condition in group:
+            cond_mask = _condition_mask(df, condition, index_lookup)
+            group_mask = cond_mask if group_mask is None else group_mask & cond_mask
+        mask = group_mask if mask is None else mask | group_mask
+    return mask
+
+
+def describe_conditions(conditions):
+    """Human readable version of the WHERE clause."""
+    def fmt(condition):
+        value = condition['value']
+        if condition['kind'] == 'date':
+            value = value.date().isoformat()
+        elif condition['kind'] == 'number' and float(value).is_integer():
+            value = int(value)
+        return f"{condition['column']} {OPERATOR_WORDS[condition['op']]} {value}"
+
+    return ' or '.join(' and '.join(fmt(c) for c in group) for group in conditions)
+
+
+def _to_python(value):
+    if pd.isna(value):
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+def execute_query(df, spec, index_lookup=None):
+    """
+    Run a compiled spec against df with one mask and at most one groupby pass.
+    index_lookup(column) may return a NumericIndex for the dataset.
+    """
+    where = describe_conditions(spec['conditions']) if spec['conditions'] else ''
+    where_suffix = f" where {where}" if where else ''
+
+    # Plain "count where <numeric range>" is answered by binary search alone
+    condition = _single_numeric_condition(spec['conditions'])
+    if (condition and index_lookup and spec['mode'] == 'aggregate' and not spec['group_by']
+            and (spec['aggregation'] == 'count' or not spec['targets'])):
+        index = index_lookup(condition['column'])
+        if index is not None:
+            count = index.count(condition['op'], condition['value'])
+            return {"answer": f"{count} rows{where_suffix}", "type": "count", "count": count}
+
+    mask = build_mask(df, spec['conditions'], index_lookup) if spec['conditions'] else None
+    frame = df[mask] if mask is not None else df
+
+    if spec['mode'] == 'select':
+        filter_cols = [c['column'] for group in spec['conditions'] for c in group]
+        select = spec['select']
+        detail_cols = list(dict.fromkeys(select + filter_cols)) if select else frame.columns.tolist()
+        result = {
+            "answer": f"{len(frame)} rows found{where_suffix}",
+            "type": "conditional_filter",
+            "count": len(frame),
+            "details": frame[detail_cols].head(10).to_dict(orient='records'),
+        }
+        if select:
+            result["column"] = select[0]
+            result["values"] = frame[select[0]].head(20).tolist()
+        return result
+
+    func = spec['aggregation']
+    targets = spec['targets']
+    group_by = spec['group_by']
+    label = AGGREGATION_LABELS[func]
+
+    values = frame[targets].apply(pd.to_numeric, errors='coerce') if targets else None
+
+    if not group_by:
+        if func == 'count' or not targets:
+            return {
+                "answer": f"{len(frame)} rows{where_suffix}",
+                "type": "count",
+                "count": len(frame),
+            }
+        aggregated = values.agg(func)
+        parts = [f"{label} {col}: {_to_python(aggregated[col])}" for col in targets]
+        return {
+            "answer": ', '.join(parts) + where_suffix,
+            "type": func if func != 'mean' else 'average',
+            "count": len(frame),
+            "values": {col: _to_python(aggregated[col]) for col in targets},
+        }
+
+    keys = [frame[col] for col in group_by]
+    if func == 'count' or not targets:
+        grouped = frame.groupby(keys, dropna=False).size().to_frame('count')
+    else:
+        grouped = values.groupby(keys, dropna=False).agg(func)
+    grouped = grouped.reset_index()
+
+    details = [
+        {col: _to_python(val) for col, val in row.items()}
+        for row in grouped.head(MAX_GROUPS).to_dict(orient='records')
+    ]
+    measured = ', '.join(targets) if targets and func != 'count' else 'rows'
+    return {
+        "answer": f"{label} {measured} by {', '.join(group_by)}{where_suffix} ({len(grouped)} groups)",
+        "type": "group_by",
+        "aggregation": func,
+        "group_by": group_by,
+        "count": len(frame),
+        "group_count": len(grouped),
+        "details": details,
+    }
@@ -0,0 +1,363 @@
+"""
+Shared dataset residency.
+
+A parsed spreadsheet is written once as an uncompressed Arrow IPC file in a
+shared-memory directory (/dev/shm when available). Every worker on the node
+memory-maps that file, so columns are read-only, zero-copy views of the same
+physical pages instead of one DataFrame copy per worker. Numeric and date
+columns map to NumPy arrays; text columns stay Arrow-backed (the
+"string[pyarrow_numpy]" dtype: NaN for missing values, NumPy bools from
+comparisons) rather than becoming Python objects in every worker.
+
+The files in the directory share one memory budget (DATASET_MEMORY_BUDGET_MB).
+Adding a dataset over budget evicts unpinned datasets, largest idle size
+(seconds since last access x bytes) first. Recency is tracked through file
+modification times, so every worker sees the same state. Pin hot datasets
+with pin_dataset() or the PINNED_DATASETS list of file names.
+
+Which dataset is active is shared the same way: set_active_dataset() writes a
+pointer file in the cache dir that get_active_dataset() reads in any worker.
+
+Small frames derived from a dataset version, like the sample kept for
+approximate queries, are stored alongside it with save_companion() and count
+against the same budget.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction is best effort without a lock
+    fcntl = None
+
+
+def _default_cache_dir():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'spreadsheet-manager')
+
+
+DATASET_CACHE_DIR = os.getenv('DATASET_CACHE_DIR', _default_cache_dir())
+MEMORY_BUDGET = int(float(os.getenv('DATASET_MEMORY_BUDGET_MB', '1024')) * 1024 * 1024)
+PINNED_DATASETS = {name.strip() for name in os.getenv('PINNED_DATASETS', '').split(',') if name.strip()}
+
+ACTIVE_POINTER = 'active'
+
+# Active dataset for this worker, used when the shared pointer can't be written
+_active_path = None
+
+# Worker-local handles: dataset key -> (DataFrame over the mapped file, arrow path)
+_attached = {}
+_attached_lock = threading.Lock()
+
+
+def dataset_id(path):
+    """Stable id for a source file version, shared by all workers."""
+    stat = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _arrow_path(version, name=None):
+    suffix = f".{name}.arrow" if name else ".arrow"
+    return os.path.join(DATASET_CACHE_DIR, f"{version}{suffix}")
+
+
+def _pin_path(path):
+    name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return os.path.join(DATASET_CACHE_DIR, f"{name}.pin")
+
+
+def pin_dataset(path):
+    """Keep a source file's datasets out of eviction, for every worker."""
+    os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+    with open(_pin_path(path), 'w') as f:
+        f.write(os.path.abspath(path))
+
+
+def unpin_dataset(path):
+    try:
+        os.remove(_pin_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def set_active_dataset(path):
+    """
+    Make a source file the active dataset for every worker, through a small
+    pointer file in the cache dir replaced atomically.
+    """
+    global _active_path
+    _active_path = os.path.abspath(path)
+    try:
+        os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=DATASET_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(_active_path)
+        os.replace(tmp_path, os.path.join(DATASET_CACHE_DIR, ACTIVE_POINTER))
+    except OSError as e:
+        print(f"Warning: could not share the active dataset, keeping it in this worker: {e}")
+
+
+def get_active_dataset():
+    """Path of the active source file, or None."""
+    try:
+        with open(os.path.join(DATASET_CACHE_DIR, ACTIVE_POINTER)) as f:
+            path = f.read().strip()
+    except OSError:
+        path = _active_path
+    if not path or not os.path.exists(path):
+        return None
+    return path
+
+
+def _read_source(path):
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    return pd.read_excel(path)
+
+
+def _to_arrow(df):
+    """
+    Convert df to an Arrow table, or None if it has columns Arrow can't hold
+    (e.g. mixed-type object columns). Float NaNs stay NaN values rather than
+    nulls so the columns map back to NumPy without a copy.
+    """
+    if not all(isinstance(col, str) for col in df.columns) or df.columns.duplicated().any():
+        return None
+    arrays = []
+    try:
+        for col in df.columns:
+            series = df[col]
+            if series.dtype.kind in 'fiub':
+                arrays.append(pa.array(series.to_numpy()))
+                continue
+            array = pa.array(series, from_pandas=True)
+            if pa.types.is_string(array.type):
+                # pandas' Arrow string arrays wrap large_string without a copy
+                array = array.cast(pa.large_string())
+            arrays.append(array)
+    except (pa.ArrowException, TypeError, ValueError):
+        return None
+    return pa.table(arrays, names=list(df.columns))
+
+
+def _write_arrow(table, arrow_path):
+    """Write atomically so other workers never map a half-written file."""
+    os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=DATASET_CACHE_DIR, suffix='.tmp')
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, arrow_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Text columns keep their Arrow buffers (from the mapped file) in pandas
+_TEXT_TYPES = {pa.large_string(): pd.StringDtype('pyarrow_numpy')}
+
+
+def _attach(arrow_path):
+    """Map an Arrow file into this worker as a DataFrame."""
+    table = pa.ipc.open_file(pa.memory_map(arrow_path)).read_all()
+    return _to_frame(table)
+
+
+def _to_frame(table):
+    df = table.to_pandas(split_blocks=True, types_mapper=_TEXT_TYPES.get)
+    # Arrow gives None for other missing objects; the rest of the app expects NaN
+    for i, col in enumerate(table.column_names):
+        if df[col].dtype == object and table.column(i).null_count:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+class _EvictionLock:
+    """Cross-process lock around eviction, via flock on a file in the cache dir."""
+
+    def __enter__(self):
+        os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+        self.file = open(os.path.join(DATASET_CACHE_DIR, '.lock'), 'w')
+        if fcntl:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+def _resident_files():
+    """(arrow path, size, last access) for every dataset in the cache dir."""
+    files = []
+    for name in os.listdir(DATASET_CACHE_DIR):
+        if not name.endswith('.arrow'):
+            continue
+        arrow_path = os.path.join(DATASET_CACHE_DIR, name)
+        try:
+            stat = os.stat(arrow_path)
+        except FileNotFoundError:
+            continue
+        files.append((arrow_path, stat.st_size, stat.st_mtime))
+    return files
+
+
+def enforce_budget(keep=None, pinned_paths=()):
+    """Evict unpinned datasets until the cache fits in MEMORY_BUDGET."""
+    with _EvictionLock():
+        files = _resident_files()
+        total = sum(size for _, size, _ in files)
+        if total <= MEMORY_BUDGET:
+            return
+
+        now = time.time()
+        protected = {keep} | set(pinned_paths)
+        candidates = [f for f in files if f[0] not in protected]
+        # Idle-time x size: big datasets nobody has touched go first
+        candidates.sort(key=lambda f: (now - f[2]) * f[1], reverse=True)
+
+        for arrow_path, size, _ in candidates:
+            if total <= MEMORY_BUDGET:
+                break
+            try:
+                # Workers that still map the file keep their view until they drop it
+                os.remove(arrow_path)
+                total -= size
+                print(f"Evicted dataset {os.path.basename(arrow_path)} ({size} bytes)")
+            except OSError:
+                pass
+
+
+def _pinned_arrow_paths():
+    pinned = set()
+    for name in os.listdir(DATASET_CACHE_DIR):
+        if not name.endswith('.pin'):
+            continue
+        try:
+            with open(os.path.join(DATASET_CACHE_DIR, name)) as f:
+                source = f.read().strip()
+            pinned.add(_arrow_path(dataset_id(source)))
+        except OSError:
+            continue
+    return pinned
+
+
+def _drop_stale_handles():
+    """Forget mappings whose file another worker evicted."""
+    with _attached_lock:
+        for key, (_, arrow_path) in list(_attached.items()):
+            if not os.path.exists(arrow_path):
+                del _attached[key]
+
+
+def _touch(arrow_path):
+    try:
+        os.utime(arrow_path)
+    except OSError:
+        pass
+
+
+def get_dataset(path):
+    """
+    DataFrame for a source spreadsheet, attached from shared memory when
+    resident and parsed + published there otherwise. Callers get a shallow
+    copy: adding or replacing columns is fine, writing into them is not.
+    """
+    version = dataset_id(path)
+    arrow_path = _arrow_path(version)
+    _drop_stale_handles()
+
+    with _attached_lock:
+        handle = _attached.get(version)
+    if handle is not None:
+        _touch(arrow_path)
+        return handle[0].copy(deep=False)
+
+    if os.path.exists(arrow_path):
+        try:
+            df = _attach(arrow_path)
+            _touch(arrow_path)
+            with _attached_lock:
+                _attached[version] = (df, arrow_path)
+            return df.copy(deep=False)
+        except (OSError, pa.ArrowInvalid):
+            pass  # evicted or replaced while we opened it; parse it again
+
+    df = _read_source(path)
+    table = _to_arrow(df)
+    if table is None or table.nbytes > MEMORY_BUDGET:
+        # Can't be shared; this worker keeps no copy between requests
+        return df
+
+    try:
+        _write_arrow(table, arrow_path)
+        if os.path.basename(path) in PINNED_DATASETS:
+            pin_dataset(path)
+        enforce_budget(keep=arrow_path, pinned_paths=_pinned_arrow_paths())
+        shared = _attach(arrow_path)
+    except (OSError, pa.ArrowInvalid) as e:
+        # Cache dir full or unwritable, or another worker evicted the file
+        # straight away; serve the parsed copy
+        print(f"Warning: could not share dataset {path}: {e}")
+        return df
+    with _attached_lock:
+        _attached[version] = (shared, arrow_path)
+    return shared.copy(deep=False)
+
+
+def save_companion(path, name, df, metadata):
+    """
+    Publish a small frame derived from a dataset version (e.g. its sample)
+    next to it, with JSON-serializable metadata, so every worker can load it.
+    Returns False if df can't be stored as Arrow or the cache dir can't be
+    written.
+    """
+    table = _to_arrow(df)
+    if table is None:
+        return False
+    table = table.replace_schema_metadata({'companion': json.dumps(metadata)})
+    try:
+        _write_arrow(table, _arrow_path(dataset_id(path), name))
+    except OSError:
+        return False
+    return True
+
+
+def load_companion(path, name):
+    """(frame, metadata) saved with save_companion for this version of path, or None."""
+    companion_path = _arrow_path(dataset_id(path), name)
+    try:
+        table = pa.ipc.open_file(pa.memory_map(companion_path)).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+    _touch(companion_path)
+    metadata = json.loads(table.schema.metadata[b'companion'])
+    return _to_frame(table.replace_schema_metadata(None)), metadata
+
+
+def residency_stats():
+    """Budget usage of the shared cache, for monitoring."""
+    if not os.path.isdir(DATASET_CACHE_DIR):
+        return {"datasets": 0, "bytes": 0, "budget": MEMORY_BUDGET, "attached": 0}
+    files = _resident_files()
+    with _attached_lock:
+        attached = len(_attached)
+    return {
+        "datasets": len(files),
+        "bytes": sum(size for _, size, _ in files),
+        "budget": MEMORY_BUDGET,
+        "attached": attached,
+    }
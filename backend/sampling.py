@@ -0,0 +1,266 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from query_engine import build_mask, compile_query, describe_conditions
+from residency import dataset_id, load_companion, save_companion
+
+SAMPLE_SIZE = int(os.getenv('APPROX_SAMPLE_SIZE', '10000'))
+MAX_SAMPLED_DATASETS = 4
+MAX_STRATA = 50
+MIN_PER_STRATUM = 30
+Z_95 = 1.96
+
+# Aggregations that have an unbiased sample estimator
+APPROXIMATE_AGGREGATIONS = {
+    'sum': 'sum',
+    'total': 'sum',
+    'mean': 'mean',
+    'average': 'mean',
+    'avg': 'mean',
+}
+
+STRATUM_COLUMN = '__stratum__'
+
+# Worker-local cache of samples loaded from the shared cache dir:
+# dataset version id -> sample info, least recently used first
+_samples = OrderedDict()
+_samples_lock = threading.Lock()
+
+
+def _pick_strata_column(df):
+    """First text column with a small number of distinct values, if any."""
+    for col in df.select_dtypes(exclude='number').columns:
+        distinct = df[col].nunique(dropna=False)
+        if 1 < distinct <= MAX_STRATA:
+            return col
+    return None
+
+
+def build_sample(path, df, size=SAMPLE_SIZE, seed=42):
+    """
+    Draw a stratified random sample of df at ingest and keep it for
+    approximate queries. Strata are the values of a low-cardinality text
+    column (proportional allocation with a small floor per stratum); without
+    one the whole table is a single stratum. With a source path the sample is
+    published next to the shared dataset, so every worker can use it.
+    """
+    strata_column = _pick_strata_column(df)
+    if strata_column:
+        labels = df[strata_column].astype(str)
+    else:
+        labels = pd.Series('all', index=df.index)
+
+    codes, uniques = pd.factorize(labels)
+    population_sizes = np.bincount(codes, minlength=len(uniques))
+
+    if len(df) <= size:
+        picked = np.arange(len(df))
+    else:
+        rng = np.random.default_rng(seed)
+        picked = []
+        for code, population in enumerate(population_sizes):
+            members = np.flatnonzero(codes == code)
+            quota = max(int(round(size * population / len(df))), MIN_PER_STRATUM)
+            quota = min(quota, population)
+            picked.append(rng.choice(members, size=quota, replace=False))
+        picked = np.sort(np.concatenate(picked))
+
+    info = {
+        'frame': df.iloc[picked].reset_index(drop=True),
+        'strata': codes[picked],
+        'strata_column': strata_column,
+        'population_sizes': population_sizes,
+        'population': len(df),
+    }
+
+    if path is not None:
+        _save_sample(path, info)
+        _remember(dataset_id(path), info)
+    return info
+
+
+def _save_sample(path, info):
+    frame = info['frame'].copy(deep=False)
+    frame[STRATUM_COLUMN] = info['strata']
+    metadata = {
+        'strata_column': info['strata_column'],
+        'population_sizes': info['population_sizes'].tolist(),
+        'population': info['population'],
+    }
+    if not save_companion(path, 'sample', frame, metadata):
+        print(f"Sample for {path} can't be shared; keeping it in this worker only")
+
+
+def _load_sample(path):
+    stored = load_companion(path, 'sample')
+    if stored is None:
+        return None
+    frame, metadata = stored
+    strata = frame.pop(STRATUM_COLUMN).to_numpy(dtype=np.intp)
+    return {
+        'frame': frame,
+        'strata': strata,
+        'strata_column': metadata['strata_column'],
+        'population_sizes': np.asarray(metadata['population_sizes'], dtype=np.int64),
+        'population': metadata['population'],
+    }
+
+
+def _remember(key, info):
+    with _samples_lock:
+        _samples[key] = info
+        _samples.move_to_end(key)
+        while len(_samples) > MAX_SAMPLED_DATASETS:
+            _samples.popitem(last=False)
+
+
+def get_sample(path):
+    """Return the sample kept for the current version of a source file, or None."""
+    if not path or not os.path.exists(path):
+        return None
+    key = dataset_id(path)
+    with _samples_lock:
+        info = _samples.get(key)
+        if info is not None:
+            _samples.move_to_end(key)
+            return info
+    info = _load_sample(path)
+    if info is not None:
+        _remember(key, info)
+    return info
+
+
+def _estimate_total(z, info):
+    """Stratified estimate of the population total of z and its variance."""
+    strata = info['strata']
+    population_sizes = info['population_sizes'].astype(float)
+    n = np.bincount(strata, minlength=len(population_sizes)).astype(float)
+    sums = np.bincount(strata, weights=z, minlength=len(population_sizes))
+    squares = np.bincount(strata, weights=z * z, minlength=len(population_sizes))
+
+    sampled = n > 0
+    means = np.zeros_like(n)
+    means[sampled] = sums[sampled] / n[sampled]
+    variances = np.zeros_like(n)
+    several = n > 1
+    variances[several] = (squares[several] - n[several] * means[several] ** 2) / (n[several] - 1)
+    variances = np.clip(variances, 0, None)
+
+    total = float((population_sizes * means).sum())
+    fpc = np.zeros_like(n)
+    fpc[sampled] = 1 - n[sampled] / population_sizes[sampled]
+    variance = np.zeros_like(n)
+    variance[sampled] = population_sizes[sampled] ** 2 * fpc[sampled] * variances[sampled] / n[sampled]
+    return total, float(variance.sum())
+
+
+def _mentioned_column(query, columns):
+    """
+    Column named in the query as a whole word (longest name first), so
+    "average salary" picks salary rather than age.
+    """
+    text = ' ' + re.sub(r'[^a-z0-9]+', ' ', query.lower()) + ' '
+    named = []
+    for col in columns:
+        name = re.sub(r'[^a-z0-9]+', ' ', str(col).lower()).strip()
+        if name and re.search(r' ' + re.escape(name) + r's? ', text):
+            named.append((len(name), col))
+    return max(named, key=lambda item: item[0])[1] if named else None
+
+
+def _simple_spec(query, columns, numeric_cols):
+    """Spec for keyword queries without a WHERE clause, e.g. "average salary"."""
+    clean_query = re.sub(r'[^a-z0-9\s]', '', query)
+    if any(k in clean_query for k in ["how many rows", "number of rows", "row count", "count rows"]):
+        return {'mode': 'aggregate', 'aggregation': 'count', 'targets': [], 'conditions': [], 'group_by': []}
+
+    for keyword, func in APPROXIMATE_AGGREGATIONS.items():
+        if not re.search(r'\b' + keyword + r'\b', clean_query):
+            continue
+        matched = _mentioned_column(query, columns)
+        target = matched if matched in numeric_cols else (numeric_cols[0] if numeric_cols else None)
+        if target:
+            return {'mode': 'aggregate', 'aggregation': func, 'targets': [target],
+                    'conditions': [], 'group_by': []}
+    return None
+
+
+def _fmt(value):
+    return round(value, 2)
+
+
+def approximate_answer(info, query):
+    """
+    Answer a count/sum/average query from the sample with a 95% confidence
+    interval. Returns None if the query needs the full data.
+    """
+    frame = info['frame']
+    columns = frame.columns.tolist()
+    numeric_cols = frame.select_dtypes(include='number').columns.tolist()
+
+    spec = compile_query(query, columns) or _simple_spec(query, columns, numeric_cols)
+    if not spec or spec['mode'] != 'aggregate' or spec['group_by']:
+        return None
+    func = spec['aggregation'] if spec['targets'] else 'count'
+    if func not in ('count', 'sum', 'mean') or len(spec['targets']) > 1:
+        return None
+
+    if spec['conditions']:
+        selected = np.asarray(build_mask(frame, spec['conditions']), dtype=float)
+        where_suffix = f" where {describe_conditions(spec['conditions'])}"
+    else:
+        selected = np.ones(len(frame))
+        where_suffix = ''
+
+    # The row count is known exactly; only filtered rows need estimating
+    exact = len(frame) == info['population'] or (func == 'count' and not spec['conditions'])
+    if func == 'count' and not spec['conditions']:
+        estimate, variance = float(info['population']), 0.0
+        label = f"{info['population']} rows"
+        answer_type = 'count'
+    elif func == 'count':
+        estimate, variance = _estimate_total(selected, info)
+        label = f"{int(round(estimate))} rows"
+        answer_type = 'count'
+    else:
+        target = spec['targets'][0]
+        values = pd.to_numeric(frame[target], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        present = selected * ~np.isnan(values)
+        weighted = np.nan_to_num(values) * present
+        total, total_variance = _estimate_total(weighted, info)
+        if func == 'sum':
+            estimate, variance = total, total_variance
+            label = f"Total {target}: {_fmt(estimate)}"
+            answer_type = 'sum'
+        else:
+            # Ratio estimator with a linearized variance
+            count, _ = _estimate_total(present, info)
+            if count == 0:
+                return None
+            estimate = total / count
+            _, residual_variance = _estimate_total(weighted - estimate * present, info)
+            variance = residual_variance / count ** 2
+            label = f"Average {target}: {_fmt(estimate)}"
+            answer_type = 'average'
+
+    margin = Z_95 * variance ** 0.5
+    result = {
+        "query": query,
+        "type": answer_type,
+        "mode": 'exact' if exact else 'approximate',
+        "estimate": estimate,
+        "confidence": 0.95,
+        "confidence_interval": [estimate - margin, estimate + margin],
+        "sample_size": len(frame),
+        "population": info['population'],
+    }
+    if exact:
+        result["answer"] = label + where_suffix
+    else:
+        result["answer"] = f"≈ {label} (± {_fmt(margin)}, 95% CI){where_suffix}"
+    return result